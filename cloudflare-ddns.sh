@@ -24,25 +24,47 @@ GREEN='\033[0;32m'
 YELLOW='\033[1;33m'
 NC='\033[0m' # No Color
 
+# Body of the DNS record update (type, name, content, ttl, proxied)
+UPDATE_TEMPLATE='{"type":"%s","name":"%s","content":"%s","ttl":%s,"proxied":%s}'
+
 ################################################################################
 # Functions
 ################################################################################
 
+# Print to the terminal and append to the log file (builtins only, no tee)
+write_log() {
+    echo "$@"
+    echo "$@" >> "$LOG_FILE"
+}
+
 log() {
-    local timestamp=$(date '+%Y-%m-%d %H:%M:%S')
-    echo "[$timestamp] $1" | tee -a "$LOG_FILE"
+    local timestamp
+    printf -v timestamp '%(%Y-%m-%d %H:%M:%S)T' -1
+    write_log "[$timestamp] $1"
 }
 
 log_error() {
-    echo -e "${RED}✗ $1${NC}" | tee -a "$LOG_FILE"
+    write_log -e "${RED}✗ $1${NC}"
 }
 
 log_success() {
-    echo -e "${GREEN}✓ $1${NC}" | tee -a "$LOG_FILE"
+    write_log -e "${GREEN}✓ $1${NC}"
 }
 
 log_info() {
-    echo -e "${YELLOW}ℹ $1${NC}" | tee -a "$LOG_FILE"
+    write_log -e "${YELLOW}ℹ $1${NC}"
+}
+
+# Check for a dotted-quad IPv4 address using builtins only (no regex)
+is_ipv4() {
+    local a b c d extra octet
+    IFS=. read -r a b c d extra <<< "$1"
+    [[ -z "$extra" && "$1" != *. ]] || return 1
+    for octet in "$a" "$b" "$c" "$d"; do
+        [[ -n "$octet" && "$octet" != *[!0-9]* && ${#octet} -le 3 ]] || return 1
+        [[ "$octet" == 0 || "$octet" != 0* ]] || return 1  # No leading zeros
+        (( 10#$octet < 256 )) || return 1
+    done
 }
 
 get_public_ip() {
@@ -55,7 +77,7 @@ get_public_ip() {
     
     for service in "${services[@]}"; do
         ip=$(curl -s --max-time 5 "$service" 2>/dev/null | tr -d '[:space:]')
-        if [[ $ip =~ ^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}$ ]]; then
+        if is_ipv4 "$ip"; then
             echo "$ip"
             return 0
         fi
@@ -74,23 +96,53 @@ save_cached_ip() {
     echo "$1" > "$IP_CACHE_FILE"
 }
 
+# Call the Cloudflare API for this zone: cf_api METHOD PATH [DATA]
+# URL and headers are passed to curl as a config on stdin, so the API token
+# never shows up in the process list.
+cf_api() {
+    local method="$1"
+    local path="$2"
+    local data="$3"
+    local args=(-s -K -)
+    [[ -n "$data" ]] && args+=(--data "$data")
+    
+    curl "${args[@]}" <<EOF
+url = "https://api.cloudflare.com/client/v4/zones/$CF_ZONE_ID/$path"
+request = "$method"
+header = "Authorization: Bearer $CF_API_TOKEN"
+header = "Content-Type: application/json"
+EOF
+}
+
 get_dns_record() {
-    local response=$(curl -s -X GET \
-        "https://api.cloudflare.com/client/v4/zones/$CF_ZONE_ID/dns_records?name=$CF_RECORD_NAME" \
-        -H "Authorization: Bearer $CF_API_TOKEN" \
-        -H "Content-Type: application/json")
+    cf_api GET "dns_records?name=$CF_RECORD_NAME"
+}
+
+# Extract the fields we need from a Cloudflare API response in one pass.
+# Sets success, record_id, record_type and ttl in the caller's scope.
+parse_cf_response() {
+    local response="$1"
     
-    echo "$response"
+    if [[ "$HAVE_JQ" == true ]]; then
+        IFS='|' read -r success record_id record_type ttl < <(jq -r \
+            '[.success, .result[0]?.id?, .result[0]?.type?, .result[0]?.ttl?] | map(if . == null then "" else tostring end) | join("|")' \
+            <<< "$response" 2>/dev/null)
+        return
+    fi
+    
+    # Without jq, match with bash's builtin regex (first occurrence, no forks)
+    success="" record_id="" record_type="" ttl=""
+    [[ $response =~ \"success\":[[:space:]]*(true|false) ]] && success="${BASH_REMATCH[1]}"
+    [[ $response =~ \"id\":[[:space:]]*\"([^\"]*)\" ]] && record_id="${BASH_REMATCH[1]}"
+    [[ $response =~ \"type\":[[:space:]]*\"([^\"]*)\" ]] && record_type="${BASH_REMATCH[1]}"
+    [[ $response =~ \"ttl\":[[:space:]]*([0-9]+) ]] && ttl="${BASH_REMATCH[1]}"
 }
 
 update_dns_record() {
     local record_id="$1"
     local new_ip="$2"
-    local record_data="$3"
-    
-    # Extract record details
-    local record_type=$(echo "$record_data" | grep -o '"type":"[^"]*"' | head -1 | cut -d'"' -f4)
-    local ttl=$(echo "$record_data" | grep -o '"ttl":[^,}]*' | head -1 | cut -d':' -f2)
+    local record_type="$3"
+    local ttl="$4"
     
     # Default values if not found
     [[ -z "$record_type" ]] && record_type="A"
@@ -100,24 +152,11 @@ update_dns_record() {
     local proxied_value="true"
     [[ "$CF_PROXY_ENABLED" == false ]] && proxied_value="false"
     
-    local update_data=$(cat <<EOF
-{
-    "type": "$record_type",
-    "name": "$CF_RECORD_NAME",
-    "content": "$new_ip",
-    "ttl": $ttl,
-    "proxied": $proxied_value
-}
-EOF
-)
-    
-    local response=$(curl -s -X PUT \
-        "https://api.cloudflare.com/client/v4/zones/$CF_ZONE_ID/dns_records/$record_id" \
-        -H "Authorization: Bearer $CF_API_TOKEN" \
-        -H "Content-Type: application/json" \
-        --data "$update_data")
+    local update_data
+    printf -v update_data "$UPDATE_TEMPLATE" \
+        "$record_type" "$CF_RECORD_NAME" "$new_ip" "$ttl" "$proxied_value"
     
-    echo "$response"
+    cf_api PUT "dns_records/$record_id" "$update_data"
 }
 
 check_and_update() {
@@ -132,8 +171,8 @@ check_and_update() {
     
     log_success "Current IP: $current_ip"
     
-    # Get cached IP
-    local cached_ip=$(get_cached_ip)
+    # Get cached IP (loaded once into CACHED_IP by the caller)
+    local cached_ip="$CACHED_IP"
     
     # Check if IP has changed
     if [[ "$current_ip" == "$cached_ip" ]]; then
@@ -145,29 +184,30 @@ check_and_update() {
     
     # Get DNS record
     local record_response=$(get_dns_record)
+    local success record_id record_type ttl
+    parse_cf_response "$record_response"
     
     # Check if request was successful
-    local success=$(echo "$record_response" | grep -o '"success":[^,]*' | cut -d':' -f2)
     if [[ "$success" != "true" ]]; then
         log_error "Failed to fetch DNS record from Cloudflare"
         return 1
     fi
     
-    # Extract record ID
-    local record_id=$(echo "$record_response" | grep -o '"id":"[^"]*"' | head -1 | cut -d'"' -f4)
+    # Check record ID
     if [[ -z "$record_id" ]]; then
         log_error "DNS record not found: $CF_RECORD_NAME"
         return 1
     fi
     
     # Update DNS record
-    local update_response=$(update_dns_record "$record_id" "$current_ip" "$record_response")
+    local update_response=$(update_dns_record "$record_id" "$current_ip" "$record_type" "$ttl")
     
     # Check if update was successful
-    local update_success=$(echo "$update_response" | grep -o '"success":[^,]*' | cut -d':' -f2)
-    if [[ "$update_success" == "true" ]]; then
+    parse_cf_response "$update_response"
+    if [[ "$success" == "true" ]]; then
         log_success "DNS record updated successfully!"
         log_success "$CF_RECORD_NAME → $current_ip (Proxied: $CF_PROXY_ENABLED)"
+        CACHED_IP="$current_ip"
         save_cached_ip "$current_ip"
         return 0
     else
@@ -254,6 +294,9 @@ monitor_loop() {
     log "Proxy enabled: $CF_PROXY_ENABLED"
     log "=========================================="
     
+    # Keep the last known IP in memory; the file is only written for restarts
+    CACHED_IP=$(get_cached_ip)
+    
     while true; do
         check_and_update
         sleep "$CHECK_INTERVAL"
@@ -281,12 +324,16 @@ validate_config() {
     fi
     
     # Check for required commands
-    for cmd in curl grep; do
+    for cmd in curl; do
         if ! command -v "$cmd" &> /dev/null; then
             echo "ERROR: Required command '$cmd' not found"
             exit 1
         fi
     done
+    
+    # Use jq for parsing Cloudflare responses when available
+    HAVE_JQ=false
+    command -v jq &> /dev/null && HAVE_JQ=true
 }
 
 ################################################################################
@@ -317,6 +364,7 @@ case "${1:-start}" in
     check)
         # One-time check without daemon
         validate_config
+        CACHED_IP=$(get_cached_ip)
         check_and_update
         ;;
     *)
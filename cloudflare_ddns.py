@@ -6,16 +6,60 @@ Monitors your public IP address and updates Cloudflare DNS records when it chang
 
 import requests
 import time
+import errno
+import hashlib
 import json
+import math
+import os
+import re
+import select
+import signal
+import socket
+import statistics
+import struct
 import sys
+import tempfile
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
 
-# Configuration
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    tomllib = None
+
+try:
+    import orjson  # Optional: faster JSON parsing on low-power devices
+except ImportError:
+    orjson = None
+
+# Configuration (defaults; override them in CONFIG_FILE)
 CONFIG = {
     'CF_API_TOKEN': 'your_cloudflare_api_token_here',
     'CF_ZONE_ID': 'your_zone_id_here',
-    'CF_RECORD_NAME': 'subdomain.example.com',  # The DNS record to update
+    # The DNS record to update, or a list of records sharing the same IP
+    'CF_RECORD_NAME': 'subdomain.example.com',
     'CHECK_INTERVAL': 300,  # Check every 5 minutes (in seconds)
+    'API_TIMEOUT': 5,  # Timeout for Cloudflare API calls (in seconds)
+    'ADAPTIVE_POLLING': True,  # Place checks using the observed IP change history
+    # Reuse the last public IP without asking IP_CHECK_SERVICES while the local
+    # network (default route and source address) is unchanged and the IP is
+    # younger than this many seconds. 0 disables it; only enable it if your
+    # public IP can't change behind a router without the local network noticing.
+    'IP_PROBE_SOFT_TTL': 0,
+    # On Linux, a change of a local IPv4 address always triggers an immediate
+    # check. When this is > 0, rely on those events and only poll this often
+    # (e.g. 21600 = 6 hours) as a safety net. Keep it 0 behind NAT, where the
+    # public IP changes without any local address change.
+    'NETLINK_HEARTBEAT': 0,
+    # Asked first for the public IP (one UDP round trip); empty list disables
+    'STUN_SERVERS': [
+        'stun.cloudflare.com:3478'
+    ],
     'IP_CHECK_SERVICES': [
         'https://api.ipify.org',
         'https://ifconfig.me/ip',
@@ -23,37 +67,537 @@ CONFIG = {
     ]
 }
 
+# Built-in values, used to check the types of settings from CONFIG_FILE
+CONFIG_DEFAULTS = dict(CONFIG)
+
+# Numeric settings that can't be 0 (the others use 0 to mean "disabled")
+POSITIVE_SETTINGS = {'CHECK_INTERVAL', 'API_TIMEOUT'}
+
+# Settings from this file override CONFIG. Keys match CONFIG's, in any case, e.g.
+#   cf_api_token = "..."
+#   check_interval = 600
+CONFIG_FILE = Path.home() / '.config' / 'cloudflare_ddns.toml'
+
+# Answers from IP lookups must be a dotted-quad IPv4 address (ASCII octets
+# 0-255 without leading zeros)
+IPV4_OCTET = r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+IPV4_RE = re.compile(rf'^(?:{IPV4_OCTET}\.){{3}}{IPV4_OCTET}\Z')
+
+# STUN constants (RFC 5389)
+STUN_BINDING_REQUEST = 0x0001
+STUN_BINDING_RESPONSE = 0x0101
+STUN_MAGIC_COOKIE = 0x2112A442
+STUN_MAPPED_ADDRESS = 0x0001
+STUN_XOR_MAPPED_ADDRESS = 0x0020
+
+# Netlink constants for IPv4 address change notifications (linux/rtnetlink.h)
+RTMGRP_IPV4_IFADDR = 0x10
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+NLMSG_HEADER = struct.Struct('=IHHII')  # length, type, flags, seq, pid
+
+# Pooled connections are dropped once the session has been idle this long (in
+# seconds), so we never reuse a socket the server side has already given up on.
+# With the default CHECK_INTERVAL this means a fresh pool for every check;
+# connections are reused within a check and across checks closer together
+# (e.g. triggered by SIGHUP or an address change).
+SESSION_MAX_IDLE = 118
+
+# Longest Retry-After (in seconds) we wait for inside a request; when a server
+# asks for more, give up and leave it to the next check
+RETRY_AFTER_MAX = 2
+
 # File to store last known IP
 IP_CACHE_FILE = Path.home() / '.cloudflare_ddns_ip.txt'
 
+# File to store the DNS records' IDs, so updates can skip the lookup
+RECORD_CACHE_FILE = Path.home() / '.cloudflare_ddns_record.json'
+
+# File to store timestamps of observed IP changes (used by adaptive polling)
+# A ring buffer: a little-endian uint32 count of changes ever recorded, then
+# HISTORY_SIZE uint32 Unix timestamps. Entry n lives in slot n % HISTORY_SIZE.
+HISTORY_FILE = Path.home() / '.cloudflare_ddns_history.bin'
+HISTORY_SIZE = 1024
+HISTORY_ENTRY = struct.Struct('<I')
+
+# Adaptive polling falls back to CHECK_INTERVAL until this many intervals are known
+ADAPTIVE_MIN_SAMPLES = 20
+
+# Never schedule two checks closer together than this (in seconds)
+ADAPTIVE_MIN_INTERVAL = 60
+
+# ...nor further apart than this many times CHECK_INTERVAL, so an IP change
+# the history didn't predict is still picked up within minutes
+ADAPTIVE_MAX_INTERVAL_FACTOR = 4
+
+
+class CappedRetry(Retry):
+    """Retry policy that gives up instead of honouring a long Retry-After.
+    
+    urllib3 sleeps for the full Retry-After inside the request, where
+    neither SIGHUP nor address events can interrupt the daemon.
+    """
+    
+    def increment(self, method=None, url=None, response=None, error=None,
+                  _pool=None, _stacktrace=None):
+        if response is not None and self.respect_retry_after_header:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None and retry_after > RETRY_AFTER_MAX:
+                reason = ResponseError(f"server asked to retry after {retry_after:.0f}s")
+                raise MaxRetryError(_pool, url, reason)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def config_type_error(key, value):
+    """Check a config file value against the type of its default in CONFIG.
+    
+    Returns a description of the expected type if the value doesn't match,
+    otherwise None.
+    """
+    default = CONFIG_DEFAULTS[key]
+    is_str_list = isinstance(value, list) and all(isinstance(v, str) for v in value)
+    if isinstance(default, bool):
+        return None if isinstance(value, bool) else "true or false"
+    if isinstance(default, (int, float)):
+        is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if key in POSITIVE_SETTINGS:
+            return None if is_number and value > 0 else "a positive number"
+        return None if is_number and value >= 0 else "a non-negative number"
+    if key == 'CF_RECORD_NAME':
+        ok = isinstance(value, str) or (is_str_list and value)
+        return None if ok else "a string or a non-empty list of strings"
+    if isinstance(default, str):
+        return None if isinstance(value, str) else "a string"
+    if isinstance(default, list):
+        return None if is_str_list else "a list of strings"
+    return None
+
+
+def load_config(path=None):
+    """Set CONFIG to the defaults overridden by the TOML config file (CONFIG_FILE by default).
+    
+    Returns False if the file exists but can't be used, including when any
+    value has the wrong type; CONFIG is then left unchanged. A missing file
+    is not an error and restores the defaults.
+    """
+    path = path or CONFIG_FILE
+    if not path.exists():
+        CONFIG.update(CONFIG_DEFAULTS)
+        return True
+    if tomllib is None:
+        print(f"✗ ERROR: Reading {path} requires Python 3.11 or newer")
+        return False
+    try:
+        settings = tomllib.loads(path.read_text())
+    except Exception as e:
+        print(f"✗ ERROR: Could not read {path}: {e}")
+        return False
+    
+    updates = dict(CONFIG_DEFAULTS)
+    valid = True
+    for key, value in settings.items():
+        if key.upper() not in CONFIG:
+            print(f"Warning: Ignoring unknown setting '{key}' in {path}")
+        elif expected := config_type_error(key.upper(), value):
+            print(f"✗ ERROR: Invalid value for '{key}' in {path}: {value!r} (expected {expected})")
+            valid = False
+        else:
+            updates[key.upper()] = value
+    
+    if not valid:
+        return False
+    CONFIG.update(updates)
+    return True
+
+
+def as_record_names(value):
+    """Normalise CF_RECORD_NAME (a name or a list of names) to a list."""
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def update_digest(record, new_ip):
+    """Short stable hash of pointing a DNS record at new_ip, used to recognise
+    repeated updates."""
+    # Always the stdlib encoder with sorted keys, so the hash doesn't depend
+    # on whether orjson is installed
+    data = {'name': record['name'], 'type': record['type'], 'content': new_ip}
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.blake2b(canonical, digest_size=8).hexdigest()
+
+
+def write_atomic(path, text):
+    """Replace a file's contents so readers never see a partial write."""
+    with tempfile.NamedTemporaryFile('w', dir=path.parent, prefix=f'.{path.name}.',
+                                     delete=False) as tmp:
+        tmp.write(text)
+    try:
+        os.replace(tmp.name, path)
+    except OSError:
+        os.unlink(tmp.name)
+        raise
+
+
+def json_loads(data):
+    """Parse a JSON response body (bytes)."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj):
+    """Serialize a JSON request body to compact bytes."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def stun_query(server, timeout=2):
+    """Ask a STUN server ('host:port') for our public IPv4 address.
+    
+    Sends a single binding request and raises OSError on timeout or
+    ValueError on a malformed response.
+    """
+    host, _, port = server.rpartition(':')
+    transaction_id = os.urandom(12)
+    request = struct.pack('!HHI', STUN_BINDING_REQUEST, 0, STUN_MAGIC_COOKIE) + transaction_id
+    
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(request, (host, int(port)))
+        data, _ = sock.recvfrom(2048)
+    
+    if len(data) < 20:
+        raise ValueError("STUN response too short")
+    msg_type, length, cookie = struct.unpack_from('!HHI', data)
+    if (msg_type != STUN_BINDING_RESPONSE or cookie != STUN_MAGIC_COOKIE
+            or data[8:20] != transaction_id):
+        raise ValueError("Unexpected STUN response")
+    
+    addresses = {}
+    offset, end = 20, min(20 + length, len(data))
+    while offset + 4 <= end:
+        attr_type, attr_length = struct.unpack_from('!HH', data, offset)
+        value = data[offset + 4:offset + 4 + attr_length]
+        if attr_type in (STUN_MAPPED_ADDRESS, STUN_XOR_MAPPED_ADDRESS) and len(value) == 8 and value[1] == 0x01:
+            address = value[4:8]
+            if attr_type == STUN_XOR_MAPPED_ADDRESS:
+                mask = struct.pack('!I', STUN_MAGIC_COOKIE)
+                address = bytes(a ^ b for a, b in zip(address, mask))
+            addresses[attr_type] = socket.inet_ntoa(address)
+        offset += 4 + ((attr_length + 3) & ~3)
+    
+    address = addresses.get(STUN_XOR_MAPPED_ADDRESS) or addresses.get(STUN_MAPPED_ADDRESS)
+    if not address:
+        raise ValueError("No IPv4 mapped address in STUN response")
+    return address
+
+
+def local_link_signature():
+    """Describe the local network path: (interface, gateway, source address).
+    
+    Reads the default route from /proc/net/route where available and asks
+    the kernel which source address it would use for outbound traffic
+    (connecting a UDP socket sends no packets). Returns None if the source
+    address can't be determined.
+    """
+    interface = gateway = None
+    try:
+        with open('/proc/net/route') as routes:
+            next(routes)
+            for line in routes:
+                fields = line.split()
+                if len(fields) > 2 and fields[1] == '00000000':
+                    interface, gateway = fields[0], fields[2]
+                    break
+    except (OSError, StopIteration):
+        pass
+    
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.connect(('1.1.1.1', 53))
+            address = probe.getsockname()[0]
+    except OSError:
+        return None
+    return interface, gateway, address
+
+
+def open_address_monitor():
+    """Subscribe to kernel IPv4 address change events.
+    
+    Returns a non-blocking netlink socket, or None where netlink isn't
+    available (non-Linux systems, restricted containers).
+    """
+    if not hasattr(socket, 'AF_NETLINK'):
+        return None
+    try:
+        monitor = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+    except OSError:
+        return None
+    try:
+        monitor.bind((0, RTMGRP_IPV4_IFADDR))
+        monitor.setblocking(False)
+    except OSError:
+        monitor.close()
+        return None
+    return monitor
+
+
+def read_address_events(monitor):
+    """Drain pending netlink messages; return True if an address was added or removed.
+    
+    Also returns True if the kernel dropped messages because the receive
+    buffer overflowed (ENOBUFS), since a change may have been among them.
+    """
+    changed = False
+    while True:
+        try:
+            data = monitor.recv(65536)
+        except BlockingIOError:
+            return changed
+        except OSError as e:
+            if e.errno == errno.ENOBUFS:
+                return True
+            raise
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+            if length < NLMSG_HEADER.size:
+                break
+            changed = changed or msg_type in (RTM_NEWADDR, RTM_DELADDR)
+            offset += (length + 3) & ~3
+
+
+def fit_change_density(intervals, points=512):
+    """Fit a Gaussian KDE to IP change intervals, tabulated on [0, U].
+
+    U is the 99th percentile of the observed intervals. Returns U, the grid,
+    and the density, CDF and partial first moment (integral of t*p(t)) at
+    each grid point.
+    """
+    upper = statistics.quantiles(intervals, n=100)[-1]
+    stdev = statistics.pstdev(intervals)
+    bandwidth = 1.06 * stdev * len(intervals) ** -0.2 or max(upper * 0.05, 1.0)
+    kernels = [statistics.NormalDist(x, bandwidth) for x in intervals]
+    grid = [upper * i / (points - 1) for i in range(points)]
+    pdf = [sum(k.pdf(t) for k in kernels) / len(kernels) for t in grid]
+    cdf = [sum(k.cdf(t) for k in kernels) / len(kernels) for t in grid]
+    moment = [0.0]
+    for i in range(1, points):
+        step = grid[i] - grid[i - 1]
+        moment.append(moment[-1] + step * (grid[i - 1] * pdf[i - 1] + grid[i] * pdf[i]) / 2)
+    return upper, grid, pdf, cdf, moment
+
+
+def _interpolate(grid, values, t):
+    """Linearly interpolate a tabulated function at t."""
+    i = bisect_right(grid, t)
+    if i <= 0:
+        return values[0]
+    if i >= len(grid):
+        return values[-1]
+    x0, x1 = grid[i - 1], grid[i]
+    return values[i - 1] + (values[i] - values[i - 1]) * (t - x0) / (x1 - x0)
+
+
+def poll_schedule(intervals, check_interval, candidates=128):
+    """Compute check times (seconds after a change) that minimise detection delay.
+
+    Given the first check L_1, the remaining ones follow the recurrence
+    L_i = L_{i-1} + (F(L_{i-1}) - F(L_{i-2})) / p(L_{i-1}), where p/F are the
+    density/CDF of the time between IP changes, and a final check is placed
+    at U. At most k checks are used, k being what a fixed check_interval
+    would spend over (0, U]. L_1 is picked among geometrically and linearly
+    spaced candidates by the lowest expected delay between a change and the
+    check that sees it.
+    """
+    upper, grid, pdf, cdf, moment = fit_change_density(intervals)
+    k = max(1, math.ceil(upper / check_interval))
+    density = lambda t: _interpolate(grid, pdf, t)
+    cumulative = lambda t: _interpolate(grid, cdf, t)
+    partial_moment = lambda t: _interpolate(grid, moment, t)
+    
+    def place(first):
+        times = [first]
+        previous = 0.0
+        while len(times) < k and times[-1] < upper:
+            current = times[-1]
+            p = density(current)
+            step = (cumulative(current) - cumulative(previous)) / p if p > 0 else upper
+            previous = current
+            times.append(current + step)
+        return [t for t in times if t < upper] + [upper]
+    
+    def expected_delay(times):
+        delay = 0.0
+        previous = 0.0
+        for t in times:
+            mass = cumulative(t) - cumulative(previous)
+            delay += t * mass - (partial_moment(t) - partial_moment(previous))
+            previous = t
+        return delay
+    
+    smallest = min(ADAPTIVE_MIN_INTERVAL, upper)
+    ratio = (upper / smallest) ** (1 / (candidates - 1))
+    firsts = [smallest * ratio ** i for i in range(candidates)]
+    firsts += [upper * i / candidates for i in range(1, candidates)]
+    return min((place(first) for first in firsts), key=expected_delay)
+
+
 class CloudflareDDNS:
-    def __init__(self, api_token, zone_id, record_name):
+    def __init__(self, api_token, zone_id, record_names):
+        self.set_credentials(api_token, zone_id, record_names)
+        self.base_url = 'https://api.cloudflare.com/client/v4'
+        self.reload_requested = False
+        self.session = self._create_session()
+        self.session_used = time.monotonic()
+        # Writing to _wake_writer interrupts the wait between checks
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self.address_monitor = open_address_monitor()
+        self.last_probe = None  # (link signature, monotonic time, IP)
+        self._cached_ip = self.load_cached_ip()
+        self.cached_records = self.load_cached_records()
+        self.change_history = self.load_change_history()
+        self.poll_times = self._next_poll_times()
+    
+    def set_credentials(self, api_token, zone_id, record_names):
+        """Set the API token, zone and DNS record(s) this updater works on."""
         self.api_token = api_token
         self.zone_id = zone_id
-        self.record_name = record_name
-        self.base_url = 'https://api.cloudflare.com/client/v4'
+        self.record_names = as_record_names(record_names)
         self.headers = {
             'Authorization': f'Bearer {api_token}',
             'Content-Type': 'application/json'
         }
     
+    def reload_config(self):
+        """Re-read CONFIG_FILE and apply it without restarting."""
+        print(f"! Reloading configuration from {CONFIG_FILE}")
+        if not load_config():
+            print("✗ Keeping the current configuration")
+            return
+        previous_zone, previous_records = self.zone_id, self.record_names
+        self.set_credentials(CONFIG['CF_API_TOKEN'], CONFIG['CF_ZONE_ID'],
+                             CONFIG['CF_RECORD_NAME'])
+        if self.zone_id != previous_zone:
+            self.invalidate_cached_records()
+        elif self.record_names != previous_records:
+            self.cached_records = self.load_cached_records()
+        self.poll_times = self._next_poll_times()
+    
+    def request_reload(self, *_):
+        """Signal handler: reload the configuration before the next check."""
+        self.reload_requested = True
+        self.trigger_check()
+    
+    def _create_session(self):
+        """Create an HTTP session that pools keep-alive connections."""
+        session = requests.Session()
+        # Retry rate limits and server errors within seconds instead of waiting
+        # for the next check. PATCH and the POST to the DNS batch endpoint
+        # only set a record's content, so they are safe to repeat.
+        retry = CappedRetry(total=4, connect=2, read=2, backoff_factor=0.5,
+                            status_forcelist=[429, 500, 502, 503, 504],
+                            allowed_methods=frozenset(['GET', 'PATCH', 'POST']),
+                            respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry)
+        session.mount('https://api.cloudflare.com', adapter)
+        for service in CONFIG['IP_CHECK_SERVICES']:
+            parts = urlsplit(service)
+            session.mount(f'{parts.scheme}://{parts.netloc}', adapter)
+        return session
+    
+    def _get_session(self):
+        """Return the HTTP session, replacing it once it has been idle too long."""
+        now = time.monotonic()
+        if now - self.session_used > SESSION_MAX_IDLE:
+            self.session.close()
+            self.session = self._create_session()
+        self.session_used = now
+        return self.session
+    
+    def close(self):
+        """Close pooled connections and the wake-up sockets."""
+        self.session.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+        if self.address_monitor:
+            self.address_monitor.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __del__(self):
+        session = getattr(self, 'session', None)
+        if session is not None:
+            session.close()
+    
     def get_public_ip(self):
         """Get current public IP address from multiple services."""
-        for service in CONFIG['IP_CHECK_SERVICES']:
+        signature = local_link_signature() if CONFIG['IP_PROBE_SOFT_TTL'] else None
+        if signature and self.last_probe:
+            probe_signature, probed_at, ip = self.last_probe
+            age = time.monotonic() - probed_at
+            if probe_signature == signature and age < CONFIG['IP_PROBE_SOFT_TTL']:
+                print(f"✓ Current IP: {ip} (local network unchanged)")
+                return ip
+        
+        ip = self.get_stun_ip() or self.get_http_ip()
+        if not ip:
+            print("✗ ERROR: Could not determine public IP from any service")
+            return None
+        
+        print(f"✓ Current IP: {ip}")
+        if signature:
+            self.last_probe = (signature, time.monotonic(), ip)
+        return ip
+    
+    def get_stun_ip(self):
+        """Get public IP address from the configured STUN servers."""
+        for server in CONFIG['STUN_SERVERS']:
             try:
-                response = requests.get(service, timeout=5)
-                if response.status_code == 200:
-                    ip = response.text.strip()
-                    print(f"✓ Current IP: {ip}")
+                ip = stun_query(server)
+                if IPV4_RE.match(ip):
                     return ip
             except Exception as e:
-                print(f"✗ Failed to get IP from {service}: {e}")
-                continue
-        
-        print("✗ ERROR: Could not determine public IP from any service")
+                print(f"✗ Failed to get IP from STUN server {server}: {e}")
         return None
     
-    def get_cached_ip(self):
+    def get_http_ip(self):
+        """Get public IP address from the HTTP IP check services."""
+        # Ask every service at once and take the first valid answer
+        services = CONFIG['IP_CHECK_SERVICES']
+        if not services:
+            return None
+        session = self._get_session()
+        executor = ThreadPoolExecutor(max_workers=len(services))
+        try:
+            futures = {executor.submit(session.get, service, timeout=5): service
+                       for service in services}
+            for future in as_completed(futures):
+                service = futures[future]
+                try:
+                    response = future.result()
+                    ip = response.text.strip()
+                    if response.status_code != 200:
+                        print(f"✗ Failed to get IP from {service}: HTTP {response.status_code}")
+                    elif not IPV4_RE.match(ip):
+                        print(f"✗ Invalid IPv4 address from {service}: {ip[:64]!r}")
+                    else:
+                        return ip
+                except Exception as e:
+                    print(f"✗ Failed to get IP from {service}: {e}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return None
+    
+    def load_cached_ip(self):
         """Read last known IP from cache file."""
         try:
             if IP_CACHE_FILE.exists():
@@ -62,64 +606,290 @@ class CloudflareDDNS:
             print(f"Warning: Could not read cached IP: {e}")
         return None
     
+    def get_cached_ip(self):
+        """Return last known IP (the cache file is only read at startup)."""
+        return self._cached_ip
+    
     def save_cached_ip(self, ip):
         """Save current IP to cache file."""
+        self._cached_ip = ip
         try:
-            IP_CACHE_FILE.write_text(ip)
+            write_atomic(IP_CACHE_FILE, ip)
         except Exception as e:
             print(f"Warning: Could not save cached IP: {e}")
     
-    def get_dns_record(self):
+    def load_cached_records(self):
+        """Read the cached details of the configured DNS records, keyed by name."""
+        try:
+            if RECORD_CACHE_FILE.exists():
+                records = json.loads(RECORD_CACHE_FILE.read_text())
+                return {name: record for name, record in records.items()
+                        if name in self.record_names}
+        except Exception as e:
+            print(f"Warning: Could not read cached DNS records: {e}")
+        return {}
+    
+    def save_cached_records(self, records, new_ip):
+        """Save the DNS record details needed to update them without a lookup.
+        
+        Each entry also keeps the update_digest() for pointing the record
+        at new_ip, which Cloudflare has just accepted.
+        """
+        for record in records:
+            self.cached_records[record['name']] = {
+                'id': record['id'],
+                'type': record['type'],
+                'name': record['name'],
+                'digest': update_digest(record, new_ip)
+            }
+        try:
+            write_atomic(RECORD_CACHE_FILE, json.dumps(self.cached_records))
+        except Exception as e:
+            print(f"Warning: Could not save cached DNS records: {e}")
+    
+    def invalidate_cached_records(self):
+        """Forget the cached DNS records so the next update looks them up again."""
+        self.cached_records = {}
+        try:
+            RECORD_CACHE_FILE.unlink(missing_ok=True)
+        except Exception as e:
+            print(f"Warning: Could not remove cached DNS records: {e}")
+    
+    def load_change_history(self):
+        """Read timestamps of previously observed IP changes, oldest first."""
+        try:
+            if HISTORY_FILE.exists():
+                data = HISTORY_FILE.read_bytes()
+                if len(data) < HISTORY_ENTRY.size:
+                    return []
+                count, = HISTORY_ENTRY.unpack_from(data)
+                slots = [t for t, in HISTORY_ENTRY.iter_unpack(data[HISTORY_ENTRY.size:])]
+                if count <= HISTORY_SIZE:
+                    return slots[:count]
+                start = count % HISTORY_SIZE
+                return slots[start:] + slots[:start]
+        except Exception as e:
+            print(f"Warning: Could not read IP change history: {e}")
+        return []
+    
+    def record_ip_change(self):
+        """Append the current time to the IP change history."""
+        now = int(time.time())
+        try:
+            fd = os.open(HISTORY_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                header = os.pread(fd, HISTORY_ENTRY.size, 0)
+                count, = HISTORY_ENTRY.unpack(header) if len(header) == HISTORY_ENTRY.size else (0,)
+                slot = HISTORY_ENTRY.size * (1 + count % HISTORY_SIZE)
+                os.pwrite(fd, HISTORY_ENTRY.pack(now), slot)
+                os.pwrite(fd, HISTORY_ENTRY.pack(count + 1), 0)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except Exception as e:
+            print(f"Warning: Could not save IP change history: {e}")
+        
+        self.change_history = (self.change_history + [now])[-HISTORY_SIZE:]
+        self.poll_times = self._next_poll_times()
+    
+    def _next_poll_times(self):
+        """Build the adaptive check schedule, or None while history is too short."""
+        if not CONFIG['ADAPTIVE_POLLING']:
+            return None
+        history = self.change_history
+        intervals = [b - a for a, b in zip(history, history[1:]) if b > a]
+        if len(intervals) < ADAPTIVE_MIN_SAMPLES:
+            return None
+        return poll_schedule(intervals, CONFIG['CHECK_INTERVAL'])
+    
+    def next_check_delay(self):
+        """Seconds to sleep until the next scheduled check."""
+        if CONFIG['NETLINK_HEARTBEAT'] and self.address_monitor:
+            return CONFIG['NETLINK_HEARTBEAT']
+        if not self.poll_times:
+            return CONFIG['CHECK_INTERVAL']
+        longest = CONFIG['CHECK_INTERVAL'] * ADAPTIVE_MAX_INTERVAL_FACTOR
+        elapsed = time.time() - self.change_history[-1]
+        for poll_time in self.poll_times:
+            if poll_time > elapsed:
+                return min(max(poll_time - elapsed, ADAPTIVE_MIN_INTERVAL), longest)
+        return CONFIG['CHECK_INTERVAL']
+    
+    def trigger_check(self, *_):
+        """Wake the monitor loop so it checks immediately (safe in signal handlers)."""
+        try:
+            self._wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # A wake-up is already pending
+    
+    def wait_for_next_check(self, timeout):
+        """Sleep until the next check is due, a local IPv4 address changes,
+        or trigger_check() is called."""
+        sources = [self._wake_reader]
+        if self.address_monitor:
+            sources.append(self.address_monitor)
+        
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select(sources, [], [], remaining)
+            if not readable:
+                return
+            if self._wake_reader in readable:
+                try:
+                    while self._wake_reader.recv(64):
+                        pass
+                except BlockingIOError:
+                    pass
+                print("! Check triggered")
+                return
+            if read_address_events(self.address_monitor):
+                print("! Local IPv4 address changed")
+                return
+    
+    def get_dns_record(self, record_name, session=None):
         """Get the DNS record details from Cloudflare."""
         url = f'{self.base_url}/zones/{self.zone_id}/dns_records'
-        params = {'name': self.record_name}
+        params = {'name': record_name}
         
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            session = session or self._get_session()
+            response = session.get(url, headers=self.headers, params=params,
+                                   timeout=CONFIG['API_TIMEOUT'])
             response.raise_for_status()
-            data = response.json()
+            data = json_loads(response.content)
             
             if data['success'] and data['result']:
                 return data['result'][0]
             else:
-                print(f"✗ DNS record not found: {self.record_name}")
+                print(f"✗ DNS record not found: {record_name}")
                 return None
         except Exception as e:
             print(f"✗ Error fetching DNS record: {e}")
             return None
     
-    def update_dns_record(self, record_id, new_ip):
-        """Update the DNS record with new IP address."""
-        url = f'{self.base_url}/zones/{self.zone_id}/dns_records/{record_id}'
-        
-        record = self.get_dns_record()
-        if not record:
-            return False
+    def get_dns_records(self, record_names):
+        """Look up several DNS records in parallel; None if any is missing."""
+        if len(record_names) == 1:
+            records = [self.get_dns_record(record_names[0])]
+        else:
+            # Fetch the session once so worker threads never rotate it
+            # underneath each other
+            session = self._get_session()
+            with ThreadPoolExecutor(max_workers=len(record_names)) as executor:
+                records = list(executor.map(lambda name: self.get_dns_record(name, session),
+                                            record_names))
+        if not all(records):
+            return None
+        return records
+    
+    def update_dns_record(self, record_id, new_ip, record):
+        """Update the DNS record with new IP address.
         
-        data = {
-            'type': record['type'],
-            'name': record['name'],
-            'content': new_ip,
-            'ttl': record.get('ttl', 1),
-            'proxied': record.get('proxied', False)
-        }
+        If Cloudflare no longer knows the record, the cached records are
+        invalidated so the caller can look them up again.
+        """
+        url = f'{self.base_url}/zones/{self.zone_id}/dns_records/{record_id}'
+        # Only the content is sent, so TTL and proxy settings changed in the
+        # dashboard are left alone
+        data = {'content': new_ip}
         
         try:
-            response = requests.put(url, headers=self.headers, json=data)
+            session = self._get_session()
+            response = session.patch(url, headers=self.headers, data=json_dumps(data),
+                                     timeout=CONFIG['API_TIMEOUT'])
+            if response.status_code in (400, 404, 410):
+                print(f"✗ DNS record {record_id} rejected by Cloudflare (HTTP {response.status_code})")
+                self.invalidate_cached_records()
+                return False
             response.raise_for_status()
-            result = response.json()
+            result = json_loads(response.content)
             
             if result['success']:
                 print(f"✓ DNS record updated successfully!")
-                print(f"  {self.record_name} → {new_ip}")
+                print(f"  {record['name']} → {new_ip}")
                 return True
             else:
                 print(f"✗ Failed to update DNS record: {result.get('errors', [])}")
+                self.invalidate_cached_records()
                 return False
         except Exception as e:
             print(f"✗ Error updating DNS record: {e}")
             return False
     
+    def update_dns_records(self, records, new_ip):
+        """Update several DNS records in a single batch request.
+        
+        Cloudflare applies a batch atomically. As with a single update, the
+        cached records are invalidated if Cloudflare rejects the batch.
+        """
+        if len(records) == 1:
+            return self.update_dns_record(records[0]['id'], new_ip, records[0])
+        
+        url = f'{self.base_url}/zones/{self.zone_id}/dns_records/batch'
+        data = {'patches': [{'id': record['id'], 'content': new_ip}
+                            for record in records]}
+        
+        try:
+            session = self._get_session()
+            response = session.post(url, headers=self.headers, data=json_dumps(data),
+                                    timeout=CONFIG['API_TIMEOUT'])
+            if response.status_code in (400, 404, 410):
+                print(f"✗ DNS record batch rejected by Cloudflare (HTTP {response.status_code})")
+                self.invalidate_cached_records()
+                return False
+            response.raise_for_status()
+            result = json_loads(response.content)
+            
+            if result['success']:
+                print(f"✓ DNS records updated successfully!")
+                for record in records:
+                    print(f"  {record['name']} → {new_ip}")
+                return True
+            else:
+                print(f"✗ Failed to update DNS records: {result.get('errors', [])}")
+                self.invalidate_cached_records()
+                return False
+        except Exception as e:
+            print(f"✗ Error updating DNS records: {e}")
+            return False
+    
+    def sync_records(self, record_names, new_ip, retry=True):
+        """Point the given DNS records at new_ip, with as few API calls as possible.
+        
+        Cached records are updated directly; only the others are looked up.
+        If Cloudflare rejects a cached record ID, everything is looked up
+        again and the update is retried once.
+        """
+        cached = [self.cached_records[name] for name in record_names
+                  if name in self.cached_records]
+        missing = [name for name in record_names if name not in self.cached_records]
+        
+        records = list(cached)
+        if missing:
+            fetched = self.get_dns_records(missing)
+            if fetched is None:
+                return False
+            records += fetched
+        
+        # Cached records carry no content, so they are always sent
+        stale = [record for record in records if record.get('content') != new_ip]
+        if stale and not self.update_dns_records(stale, new_ip):
+            if retry and cached and not self.cached_records:
+                return self.sync_records(record_names, new_ip, retry=False)
+            return False
+        
+        for record in records:
+            if record not in stale:
+                print(f"✓ DNS record {record['name']} already points to {new_ip}")
+        self.save_cached_records(records, new_ip)
+        return True
+    
+    def points_to(self, record_name, ip):
+        """Return True if Cloudflare accepted our last update of the record, for ip."""
+        record = self.cached_records.get(record_name)
+        return bool(record) and record.get('digest') == update_digest(record, ip)
+    
     def check_and_update(self):
         """Main function to check IP and update if changed."""
         print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Checking IP address...")
@@ -132,55 +902,78 @@ class CloudflareDDNS:
         # Get cached IP
         cached_ip = self.get_cached_ip()
         
+        # Records whose last update Cloudflare accepted wasn't for this IP
+        # (e.g. ones just added to CF_RECORD_NAME) need one even if the IP
+        # hasn't changed. If it has, the caches disagree and every record is
+        # updated rather than trusting either of them.
+        ip_changed = current_ip != cached_ip
+        pending = [name for name in self.record_names
+                   if ip_changed or not self.points_to(name, current_ip)]
+        
         # Check if IP has changed
-        if current_ip == cached_ip:
+        if not pending:
             print("✓ IP address unchanged, no update needed")
             return True
         
-        print(f"! IP address changed: {cached_ip} → {current_ip}")
+        if ip_changed:
+            print(f"! IP address changed: {cached_ip} → {current_ip}")
+        for name in self.record_names:
+            if name not in pending:
+                print(f"✓ DNS record {name} already points to {current_ip}")
         
-        # Get DNS record
-        record = self.get_dns_record()
-        if not record:
+        if pending and not self.sync_records(pending, current_ip):
             return False
         
-        # Update DNS record
-        if self.update_dns_record(record['id'], current_ip):
-            self.save_cached_ip(current_ip)
-            return True
-        
-        return False
+        self.save_cached_ip(current_ip)
+        if cached_ip:
+            self.record_ip_change()
+        return True
     
     def run_monitor(self):
         """Continuously monitor and update IP address."""
         print("=" * 60)
         print("Cloudflare Dynamic DNS Updater")
         print("=" * 60)
-        print(f"Monitoring: {self.record_name}")
+        print(f"Monitoring: {', '.join(self.record_names)}")
         print(f"Check interval: {CONFIG['CHECK_INTERVAL']} seconds")
+        if self.poll_times:
+            print(f"Adaptive polling: {len(self.poll_times)} checks per change cycle")
         print(f"Press Ctrl+C to stop")
+        if self.address_monitor:
+            print(f"Watching local IPv4 address changes")
+        if hasattr(signal, 'SIGHUP'):
+            print(f"Send SIGHUP to reload {CONFIG_FILE} and check immediately")
         print("=" * 60)
         
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.request_reload)
+        
         try:
             while True:
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.reload_config()
                 self.check_and_update()
-                time.sleep(CONFIG['CHECK_INTERVAL'])
+                self.wait_for_next_check(self.next_check_delay())
         except KeyboardInterrupt:
             print("\n\n✓ Monitoring stopped by user")
             sys.exit(0)
 
 
 def main():
+    if not load_config():
+        sys.exit(1)
+    
     # Validate configuration
     if CONFIG['CF_API_TOKEN'] == 'your_cloudflare_api_token_here':
-        print("ERROR: Please configure your Cloudflare API token in the script")
+        print(f"ERROR: Please configure your Cloudflare API token in {CONFIG_FILE}")
         print("\nTo get your API token:")
         print("1. Go to https://dash.cloudflare.com/profile/api-tokens")
         print("2. Create a token with 'Edit DNS' permissions")
         sys.exit(1)
     
     if CONFIG['CF_ZONE_ID'] == 'your_zone_id_here':
-        print("ERROR: Please configure your Cloudflare Zone ID")
+        print(f"ERROR: Please configure your Cloudflare Zone ID in {CONFIG_FILE}")
         print("\nTo find your Zone ID:")
         print("1. Go to your Cloudflare dashboard")
         print("2. Select your domain")